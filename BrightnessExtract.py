@@ -1,12 +1,8 @@
 import sys
 import os
-import cv2
-import numpy as np
 import logging
 import csv
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from multiprocessing import Manager
 from tkinter import Tk, filedialog, messagebox, Text, Scrollbar, END
 from tkinter import ttk
 from threading import Thread
@@ -46,6 +42,10 @@ def get_file_modification_time(filepath):
     return datetime.fromtimestamp(timestamp)
 
 def calculate_luminance(image_path):
+    # cv2 and numpy are only needed inside the worker processes, so keep them off the GUI startup path
+    import cv2
+    import numpy as np
+
     try:
         img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
         if img is None:
@@ -56,13 +56,46 @@ def calculate_luminance(image_path):
         logging.warning(f"Could not process image {image_path}: {e}")
         return None
 
-def process_image(image_path, processed_images):
+def calculate_tile_luminance(image_path, tile_grid):
+    import cv2
+    import numpy as np
+
+    try:
+        img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise ValueError(f"Image {image_path} could not be read")
+
+        # Reshape the image into rows x columns equal tiles and average each one in a single pass. Pixels left
+        # over when the image does not divide evenly are kept out of the tiles but still count towards the
+        # whole-image average, so it matches calculate_luminance.
+        rows, cols = tile_grid
+        tile_height = img.shape[0] // rows
+        tile_width = img.shape[1] // cols
+        if tile_height == 0 or tile_width == 0:
+            raise ValueError(f"Image {image_path} is smaller than the {rows}x{cols} tile grid")
+        height = tile_height * rows
+        width = tile_width * cols
+        tile_luminance = img[:height, :width].reshape(rows, tile_height, cols, tile_width, -1).mean(axis=(1, 3, 4))
+
+        channels = img.size // (img.shape[0] * img.shape[1])
+        total = tile_luminance.sum() * tile_height * tile_width * channels
+        total += np.sum(img[height:], dtype=np.float64) + np.sum(img[:height, width:], dtype=np.float64)
+        avg_luminance = total / img.size
+        return avg_luminance, tile_luminance.ravel().astype(np.float32)
+    except Exception as e:
+        logging.warning(f"Could not process image {image_path}: {e}")
+        return None, None
+
+def process_image(image_path, processed_images, tile_grid=None):
     if image_path in processed_images:
         logging.info(f"Image {image_path} already processed, skipping")
         return None
 
     logging.info(f"Started processing image: {image_path}")
-    luminance = calculate_luminance(image_path)
+    if tile_grid:
+        luminance, tile_luminance = calculate_tile_luminance(image_path, tile_grid)
+    else:
+        luminance, tile_luminance = calculate_luminance(image_path), None
     if luminance is not None:
         processed_images.append(image_path)  # Append the image path after processing
         datetime_taken = parse_datetime_from_filename(image_path)
@@ -70,28 +103,49 @@ def process_image(image_path, processed_images):
             datetime_taken = get_file_modification_time(image_path)
 
         logging.info(f"Luminance of image {image_path}: {luminance:.2f}, Taken at: {datetime_taken}")
-        return luminance, datetime_taken
+        return luminance, datetime_taken, tile_luminance
     return None
 
-def process_images(directory_path, output_filepath, progress_bar, log_text, total_images):
+def get_tile_filepath(output_filepath):
+    return os.path.splitext(output_filepath)[0] + '_tiles.npz'
+
+def save_tile_luminance(tile_filepath, tile_results, tile_grid):
+    import numpy as np
+
+    # Frames x tiles array, row-major over the grid, keyed by capture time
+    tile_results = sorted(tile_results, key=lambda result: result[0])
+    timestamps = np.array([datetime_taken for datetime_taken, _ in tile_results], dtype='datetime64[us]')
+    tiles = np.stack([tile_luminance for _, tile_luminance in tile_results])
+    np.savez_compressed(tile_filepath, timestamps=timestamps, tiles=tiles, grid=np.array(tile_grid))
+    logging.info(f"Tile luminance for {len(tile_results)} images saved to {tile_filepath}")
+    return tile_filepath
+
+def process_images(directory_path, output_filepath, progress_bar, log_text, total_images, tile_grid=None):
+    # Imported here as loading multiprocessing takes longer than the rest of the startup
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from multiprocessing import Manager
+
     images = [file.path for file in os.scandir(directory_path) if file.name.endswith(".tiff") and not file.name.startswith("._")]
 
     with Manager() as manager:
         processed_images = manager.list()
         all_results = []
+        tile_results = []
 
         num_workers = min(4, os.cpu_count() or 1)
         processed_count = 0
 
         with ProcessPoolExecutor(max_workers=num_workers) as executor:
-            futures = {executor.submit(process_image, image, processed_images): image for image in images}
+            futures = {executor.submit(process_image, image, processed_images, tile_grid): image for image in images}
 
             for future in as_completed(futures):
                 try:
                     result = future.result()
                     if result:
-                        luminance, datetime_taken = result
+                        luminance, datetime_taken, tile_luminance = result
                         all_results.append((luminance, datetime_taken))
+                        if tile_luminance is not None:
+                            tile_results.append((datetime_taken, tile_luminance))
                         log_text.insert(END, f"Determined luminance of {luminance} for image taken at {datetime_taken}\n")
                         log_text.see(END)
                 except Exception as exc:
@@ -106,9 +160,13 @@ def process_images(directory_path, output_filepath, progress_bar, log_text, tota
             with open(output_filepath, mode='w', newline='') as file:
                 writer = csv.writer(file)
                 writer.writerow(['Luminance', 'Timestamp'])
-                for row in all_results:
+                # Results arrive in completion order; write them by capture time so the file can be streamed
+                for row in sorted(all_results, key=lambda result: result[1]):
                     writer.writerow(row)
 
+            if tile_results:
+                save_tile_luminance(get_tile_filepath(output_filepath), tile_results, tile_grid)
+
             return output_filepath
         else:
             return None
@@ -125,10 +183,26 @@ def select_output_file():
         output_file_entry.delete(0, END)
         output_file_entry.insert(0, output_filepath)
 
+def parse_tile_grid(text):
+    # Accepts "rows x columns", e.g. "4x4"; blank means whole-image luminance only
+    text = text.strip().lower()
+    if not text:
+        return None
+    rows, cols = (int(value) for value in text.split('x'))
+    if rows < 1 or cols < 1:
+        raise ValueError("Tile grid dimensions must be positive.")
+    return rows, cols
+
 def start_processing():
     directory_path = input_dir_entry.get()
     output_filepath = output_file_entry.get()
 
+    try:
+        tile_grid = parse_tile_grid(tile_grid_entry.get())
+    except ValueError:
+        messagebox.showerror("Error", "Tile grid must be blank or given as rows x columns, e.g. 4x4.")
+        return
+
     if not directory_path or not os.path.isdir(directory_path):
         messagebox.showerror("Error", "Please select a valid directory.")
         return
@@ -152,7 +226,7 @@ def start_processing():
 
     def threaded_processing():
         try:
-            result = process_images(directory_path, output_filepath, progress_bar, log_text, total_images)
+            result = process_images(directory_path, output_filepath, progress_bar, log_text, total_images, tile_grid)
             if result:
                 messagebox.showinfo("Success", f"Luminance data saved to {output_filepath}")
             else:
@@ -179,14 +253,18 @@ if __name__ == "__main__":
     output_file_button = ttk.Button(root, text="Browse...", command=select_output_file)
     output_file_button.grid(row=1, column=2, padx=10, pady=10)
 
+    ttk.Label(root, text="Tile Grid (e.g. 4x4):").grid(row=2, column=0, padx=10, pady=10)
+    tile_grid_entry = ttk.Entry(root, width=10)
+    tile_grid_entry.grid(row=2, column=1, padx=10, pady=10, sticky="w")
+
     process_button = ttk.Button(root, text="Start Processing", command=start_processing)
-    process_button.grid(row=2, column=1, padx=10, pady=10)
+    process_button.grid(row=3, column=1, padx=10, pady=10)
 
     progress_bar = ttk.Progressbar(root, orient="horizontal", mode="determinate", maximum=100, value=0)
-    progress_bar.grid(row=3, column=0, columnspan=3, padx=10, pady=10, sticky="we")
+    progress_bar.grid(row=4, column=0, columnspan=3, padx=10, pady=10, sticky="we")
 
     log_frame = ttk.LabelFrame(root, text="Log")
-    log_frame.grid(row=4, column=0, columnspan=3, padx=10, pady=10, sticky="nswe")
+    log_frame.grid(row=5, column=0, columnspan=3, padx=10, pady=10, sticky="nswe")
     log_frame.grid_columnconfigure(0, weight=1)
     log_frame.grid_rowconfigure(0, weight=1)
 
@@ -0,0 +1,152 @@
+import logging
+import os
+import sys
+
+# numpy and pandas are imported inside the functions that use them, like the other scripts
+
+def read_cycle_columns(filepath, signal_column, reference_column):
+    import pandas as pd
+
+    data = pd.read_csv(filepath, usecols=['Cycle_Index', 'Test Time (h)', signal_column, reference_column])
+    data = data.dropna()
+    # Rest periods (cycle 0) carry no current, so there is nothing to correlate against
+    data = data[data['Cycle_Index'] != 0]
+    return data.sort_values(by=['Cycle_Index', 'Test Time (h)'], kind='stable')
+
+def resample_cycles(data, signal_column, reference_column, num_points):
+    import numpy as np
+
+    cycles, starts, counts = np.unique(data['Cycle_Index'].to_numpy(), return_index=True, return_counts=True)
+    time = data['Test Time (h)'].to_numpy(dtype=float)
+    cycle_start = time[starts]
+    cycle_end = time[starts + counts - 1]
+    duration = cycle_end - cycle_start
+
+    # Stack every cycle on one increasing axis, each offset past the end of the previous one, so a single
+    # np.interp call resamples all cycles without ever interpolating across a cycle boundary
+    cycle_number = np.repeat(np.arange(len(cycles)), counts)
+    spacing = duration.max() + 1 if len(cycles) else 1
+    stacked_time = cycle_number * spacing + (time - cycle_start[cycle_number])
+    fraction = np.linspace(0, 1, num_points)
+    grid = np.arange(len(cycles))[:, np.newaxis] * spacing + duration[:, np.newaxis] * fraction
+
+    signal = np.interp(grid, stacked_time, data[signal_column].to_numpy(dtype=float))
+    reference = np.interp(grid, stacked_time, data[reference_column].to_numpy(dtype=float))
+    return cycles, cycle_start, duration, counts, signal, reference
+
+def window_sums(values, start, stop):
+    import numpy as np
+
+    # Sum of each row over [start, stop) for every lag at once, from a cumulative sum with a leading zero
+    cumulative = np.concatenate([np.zeros((len(values), 1)), np.cumsum(values, axis=1)], axis=1)
+    return cumulative[:, stop] - cumulative[:, start]
+
+def cross_correlate_cycles(signal, reference, max_lag_fraction):
+    import numpy as np
+
+    # A plain correlation of the whole cycles sums over fewer samples as the lag grows, which pulls the peak
+    # towards zero lag. Instead the central part of each reference cycle is compared with the signal shifted
+    # by every lag, so all lags are measured on the same number of samples.
+    num_points = signal.shape[1]
+    max_lag = min(max(int(num_points * max_lag_fraction), 1), (num_points - 3) // 2)
+    lags = np.arange(-max_lag, max_lag + 1)
+    window = num_points - 2 * max_lag
+
+    # Removing each cycle's mean does not change the correlation below but keeps the sums small
+    signal = signal - signal.mean(axis=1, keepdims=True)
+    reference = reference - reference.mean(axis=1, keepdims=True)
+    reference = reference[:, max_lag:num_points - max_lag]
+
+    # Zero-padded FFT convolution with the signal reversed, so that index num_points - 1 - max_lag - k holds
+    # sum(signal[max_lag + t + k] * reference[t]) over the window
+    fft_length = 2 * num_points
+    cross = np.fft.irfft(np.fft.rfft(signal[:, ::-1], fft_length, axis=1) * np.fft.rfft(reference, fft_length, axis=1), fft_length, axis=1)
+    cross = cross[:, num_points - 1 - max_lag - lags]
+
+    # Pearson correlation at each lag over the window
+    start = max_lag + lags
+    signal_sum = window_sums(signal, start, start + window)
+    signal_squares = window_sums(signal ** 2, start, start + window)
+    reference_sum = reference.sum(axis=1, keepdims=True)
+    reference_squares = (reference ** 2).sum(axis=1, keepdims=True)
+    covariance = cross - signal_sum * reference_sum / window
+    variance = (signal_squares - signal_sum ** 2 / window) * (reference_squares - reference_sum ** 2 / window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = covariance / np.sqrt(np.maximum(variance, 0))
+    correlation[~np.isfinite(correlation)] = np.nan
+
+    # Strongest correlation of either sign, refined to a fraction of a sample with a parabola through its neighbours
+    peak = np.argmax(np.abs(np.nan_to_num(correlation)), axis=1)
+    rows = np.arange(len(peak))
+    peak_value = correlation[rows, peak]
+    left = np.abs(correlation[rows, np.clip(peak - 1, 0, len(lags) - 1)])
+    centre = np.abs(peak_value)
+    right = np.abs(correlation[rows, np.clip(peak + 1, 0, len(lags) - 1)])
+    denominator = left - 2 * centre + right
+    interior = (peak > 0) & (peak < len(lags) - 1) & (denominator != 0)
+    offset = np.zeros(len(peak))
+    offset[interior] = 0.5 * (left[interior] - right[interior]) / denominator[interior]
+    return lags[peak] + offset, peak_value
+
+def analyze_cycle_lag(filepath, signal_column='Brightness Derivative_smooth', reference_column='Current(mA)_smooth', num_points=512, max_lag_fraction=0.25):
+    import numpy as np
+    import pandas as pd
+
+    data = read_cycle_columns(filepath, signal_column, reference_column)
+    cycles, cycle_start, duration, counts, signal, reference = resample_cycles(data, signal_column, reference_column, num_points)
+    lag_samples, correlation = cross_correlate_cycles(signal, reference, max_lag_fraction)
+
+    # Cycles with too few points or no duration cannot be resampled meaningfully
+    usable = (counts >= 4) & (duration > 0)
+    lag_hours = np.where(usable, lag_samples * duration / (num_points - 1), np.nan)
+    correlation = np.where(usable, correlation, np.nan)
+
+    results = pd.DataFrame({
+        'Cycle_Index': cycles,
+        'Cycle Start (h)': cycle_start,
+        'Cycle Duration (h)': duration,
+        'Samples': counts,
+        'Lag (h)': lag_hours,
+        'Lag (min)': lag_hours * 60,
+        'Correlation': correlation
+    })
+    logging.info(f"Estimated {signal_column} lag behind {reference_column} for {int(usable.sum())} of {len(cycles)} cycles.")
+    return results
+
+def get_cycle_lag_filepath(filepath):
+    # combined_data.csv gives cycle_lag.csv and each channel's combined_data_<channel>.csv gives
+    # cycle_lag_<channel>.csv, so channels do not overwrite each other; other names get a _cycle_lag suffix
+    directory, filename = os.path.split(filepath)
+    name = os.path.splitext(filename)[0]
+    if name.startswith('combined_data'):
+        name = 'cycle_lag' + name[len('combined_data'):]
+    else:
+        name += '_cycle_lag'
+    return os.path.join(directory, name + '.csv')
+
+def save_cycle_lag(results, filepath):
+    output_path = get_cycle_lag_filepath(filepath)
+    results.to_csv(output_path, index=False)
+    logging.info(f"Cycle lag table saved to {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) != 2:
+        logging.error("Usage: python CycleLagAnalysis.py <combined_data.csv>")
+        sys.exit(1)
+
+    filepath = sys.argv[1]
+
+    if not os.path.exists(filepath):
+        logging.error(f"The file {filepath} does not exist.")
+        sys.exit(1)
+
+    try:
+        results = analyze_cycle_lag(filepath)
+        output_path = save_cycle_lag(results, filepath)
+        print(f"Cycle lag saved to: {output_path}")
+    except Exception as e:
+        logging.error(f"Failed to analyze cycle lag: {e}")
+        sys.exit(1)
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from CycleLagAnalysis import analyze_cycle_lag
+
+# Checks that analyze_cycle_lag recovers a known lag on synthetic cycles shaped like real cycling data.
+# Run with: python CycleLagCheck.py
+# The exit code is non-zero if any cycle's lag is off by more than the tolerance.
+
+# Lag of the brightness derivative behind the current, in minutes
+true_lag_min = 6.0
+
+# Allowed error as a fraction of one resampled point, which the parabolic peak refinement should beat
+tolerance_samples = 0.25
+
+num_cycles = 20
+num_points = 512
+
+# Current over one cycle as a function of the fraction of the cycle elapsed
+shapes = {
+    'sine': lambda phase: np.sin(2 * np.pi * phase),
+    'charge/discharge': lambda phase: np.where(phase < 0.5, 1.0, -1.0),
+    'isolated pulse': lambda phase: np.where((phase > 0.4) & (phase < 0.5), 1.0, 0.0),
+}
+
+def make_cycles(shape, sign):
+    # Cycles of 1.5 to 2.5 hours sampled every 30 seconds. The signal is the current shifted later by the
+    # true lag, carrying over from the end of the previous cycle as it would in a repeating test.
+    rng = np.random.default_rng(0)
+    cycles = []
+    start = 0.0
+    for cycle_index in range(1, num_cycles + 1):
+        duration = rng.uniform(1.5, 2.5)
+        time = np.arange(start, start + duration, 30 / 3600)
+        phase = (time - start) / duration
+        lagged_phase = (phase - true_lag_min / 60 / duration) % 1
+        cycles.append(pd.DataFrame({
+            'Cycle_Index': cycle_index,
+            'Test Time (h)': time,
+            'Current(mA)_smooth': shape(phase),
+            'Brightness Derivative_smooth': sign * shape(lagged_phase)
+        }))
+        start += duration
+    return pd.concat(cycles)
+
+def main():
+    failures = 0
+    print(f"{'Cycle shape':<28}{'Median lag (min)':>18}{'Max error':>12}{'Tolerance':>12}  Result")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, shape in shapes.items():
+            # Brightness may fall rather than rise with current, which should give the same lag
+            for sign, label in [(1, name), (-1, name + ' (inverted)')]:
+                filepath = os.path.join(directory, 'combined_data.csv')
+                make_cycles(shape, sign).to_csv(filepath, index=False)
+                results = analyze_cycle_lag(filepath, num_points=num_points)
+
+                error = (results['Lag (min)'] - true_lag_min).abs()
+                tolerance = tolerance_samples * results['Cycle Duration (h)'] * 60 / (num_points - 1)
+                passed = bool((error <= tolerance).all()) and bool((results['Correlation'] * sign > 0).all())
+                failures += 0 if passed else 1
+                result = 'ok' if passed else 'FAIL'
+                print(f"{label:<28}{results['Lag (min)'].median():>18.3f}{error.max():>12.4f}{tolerance.min():>12.4f}  {result}")
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
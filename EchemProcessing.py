@@ -1,12 +1,17 @@
-import numpy as np
 import logging
 import re
 import os
 import csv
 from datetime import datetime
-from openpyxl import load_workbook
+
+def get_channel_from_sheet_name(sheet_name):
+    # Sheets are named Channel_<channel>_<part>; long tests are split across several parts of the same channel
+    return int(sheet_name.split('_')[1])
 
 def get_sheet_data(excel_path):
+    # openpyxl is imported here rather than at module level so the usage checks below fail fast
+    from openpyxl import load_workbook
+
     voltage_data = []
     current_data = []
     cycle_index_data = []
@@ -18,6 +23,7 @@ def get_sheet_data(excel_path):
         for sheet_name in workbook.sheetnames:
             if re.match(r'^Channel_\d+_\d+$', sheet_name):
                 sheet = workbook[sheet_name]
+                channel = get_channel_from_sheet_name(sheet_name)
                 
                 rows = list(sheet.iter_rows(values_only=True))
                 header = rows[0]
@@ -40,9 +46,9 @@ def get_sheet_data(excel_path):
                             if step_idx is not None and row[step_idx] == 1:
                                 cycle_index = 0
 
-                            voltage_data.append({'Date_Time': date_time, 'Voltage(V)': voltage})
-                            current_data.append({'Date_Time': date_time, 'Current(A)': current})
-                            cycle_index_data.append({'Date_Time': date_time, 'Cycle_Index': cycle_index})
+                            voltage_data.append({'Channel': channel, 'Date_Time': date_time, 'Voltage(V)': voltage})
+                            current_data.append({'Channel': channel, 'Date_Time': date_time, 'Current(A)': current})
+                            cycle_index_data.append({'Channel': channel, 'Date_Time': date_time, 'Cycle_Index': cycle_index})
                         except Exception as e:
                             logging.error(f"Failed to process row in {sheet_name}, check the data: {e}")
                 except Exception as e:
@@ -51,19 +57,22 @@ def get_sheet_data(excel_path):
         logging.error(f"Did not extract excel information: {e}")
         return None
 
+    # Key on (channel, timestamp) so cells logged at the same instant do not overwrite each other
     combined_data = {}
     for row in voltage_data:
-        combined_data[row['Date_Time']] = {'Voltage(V)': row['Voltage(V)']}
+        combined_data[(row['Channel'], row['Date_Time'])] = {'Voltage(V)': row['Voltage(V)']}
     for row in current_data:
-        if row['Date_Time'] in combined_data:
-            combined_data[row['Date_Time']].update({'Current(A)': row['Current(A)']})
+        key = (row['Channel'], row['Date_Time'])
+        if key in combined_data:
+            combined_data[key].update({'Current(A)': row['Current(A)']})
         else:
-            combined_data[row['Date_Time']] = {'Current(A)': row['Current(A)']}
+            combined_data[key] = {'Current(A)': row['Current(A)']}
     for row in cycle_index_data:
-        if row['Date_Time'] in combined_data:
-            combined_data[row['Date_Time']].update({'Cycle_Index': row['Cycle_Index']})
+        key = (row['Channel'], row['Date_Time'])
+        if key in combined_data:
+            combined_data[key].update({'Cycle_Index': row['Cycle_Index']})
         else:
-            combined_data[row['Date_Time']] = {'Cycle_Index': row['Cycle_Index']}
+            combined_data[key] = {'Cycle_Index': row['Cycle_Index']}
 
     # Derive output directory names based on the directory where the input Excel file is located
     excel_dir = os.path.dirname(excel_path)
@@ -71,11 +80,12 @@ def get_sheet_data(excel_path):
     
     try:
         with open(output_file_name, mode='w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=['Timestamp', 'Voltage(V)', 'Current(A)', 'Cycle_Index'])
+            writer = csv.DictWriter(file, fieldnames=['Channel', 'Timestamp', 'Voltage(V)', 'Current(A)', 'Cycle_Index'])
             writer.writeheader()
-            for timestamp, data in combined_data.items():
-                row = {'Timestamp': timestamp}
-                row.update(data)
+            # Write each channel as a contiguous, time-ordered block rather than interleaved by sheet order
+            for (channel, timestamp) in sorted(combined_data, key=lambda key: (key[0], str(key[1]))):
+                row = {'Channel': channel, 'Timestamp': timestamp}
+                row.update(combined_data[(channel, timestamp)])
                 writer.writerow(row)
         
         logging.info(f"Data saved to {output_file_name}")
@@ -102,6 +112,8 @@ if __name__ == "__main__":
         logging.error(f"The file {excel_path} does not have a supported extension.")
         sys.exit(1)
     
+    from openpyxl import load_workbook
+
     try:
         workbook = load_workbook(excel_path, read_only=True, data_only=True)
         logging.info(f"Successfully opened the workbook: {excel_path}")
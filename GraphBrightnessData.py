@@ -1,22 +1,31 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from tkinter import Tk, filedialog, Listbox, MULTIPLE, Label, Checkbutton, IntVar, Button, Scrollbar, END, StringVar
+import sys
+from tkinter import Tk, Toplevel, Frame, filedialog, messagebox, Listbox, MULTIPLE, Label, Checkbutton, Radiobutton, IntVar, Button, Scrollbar, END, StringVar
 import os
+import glob
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 
-# Create the main Tkinter window
-root = Tk()
-root.title("Data Plotter")
+# pandas and matplotlib are imported inside the functions that use them so that importing this
+# module, or opening the window, does not pay for them until a file is actually loaded or plotted
 
-# Variables
-plotcurrent = IntVar(value=1)
-plotbright = IntVar(value=1)
-plotvolt = IntVar()
-plotderiv = IntVar()
-plotcycles = []
-selected_file = StringVar()
+# Data points of loaded cycles kept in memory for test comparison before the least recently used are dropped
+comparison_cache_points = 20000000
+
+# Points drawn per cycle in a comparison, so dozens of overlaid tests stay responsive
+comparison_points_per_cycle = 2000
+
+# Columns that can be compared across tests, with their axis labels
+comparison_columns = {
+    'Current(mA)_smooth': 'Current (mA)',
+    'Brightness_smooth': 'Normalized Greyscale Average',
+    'Voltage(V)_smooth': 'Voltage (V)',
+    'Brightness Derivative_smooth': 'NGA Derivative'
+}
 
 def setup_plot_styles():
+    import matplotlib.pyplot as plt
+
     # Set font properties
     plt.rcParams['font.family'] = 'Helvetica'
     plt.rcParams['font.weight'] = 'regular'  # Set to regular weight
@@ -44,6 +53,8 @@ def customize_axis(ax, color, ylabel=None):
         tick.label1.set_fontfamily('Helvetica')
 
 def adjust_plot_layout(fig, axes_list):
+    import matplotlib.pyplot as plt
+
     # Adjust the positions of the right y-axes dynamically
     pos = 1  # Initial position of the first right y-axis
     delta_pos = 0.12  # Step between the axes
@@ -57,6 +68,9 @@ def adjust_plot_layout(fig, axes_list):
     plt.subplots_adjust(left=0.167, right=0.85 + len(axes_list) * 0.07, top=0.967, bottom=0.2)
 
 def main(filepath, plotcycles, plotcurrent, plotbright, plotvolt, plotderiv):
+    import pandas as pd
+    import matplotlib.pyplot as plt
+
     setup_plot_styles()
 
     # Read data from CSV file
@@ -126,6 +140,235 @@ def main(filepath, plotcycles, plotcurrent, plotbright, plotvolt, plotderiv):
 
     plt.show()
 
+def export_tile_heatmap(tile_filepath):
+    import numpy as np
+    import pandas as pd
+    import matplotlib.pyplot as plt
+
+    setup_plot_styles()
+
+    # Tile luminance saved by BrightnessExtract: frames x tiles, tiles numbered row by row across the grid
+    with np.load(tile_filepath) as tile_file:
+        timestamps = tile_file['timestamps']
+        tiles = tile_file['tiles'] * 100 / 255
+        rows, cols = tile_file['grid']
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    tiles = tiles[order]
+    test_time = (timestamps - timestamps[0]) / np.timedelta64(1, 'h')
+    tile_names = [f'Tile_{row + 1}_{col + 1}' for row in range(rows) for col in range(cols)]
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    image = ax.imshow(tiles.T, aspect='auto', interpolation='nearest', cmap='inferno',
+                      extent=(test_time[0], test_time[-1], len(tile_names) - 0.5, -0.5))
+    ax.set_xlabel('Test Time (h)', fontsize=16)
+    ax.set_ylabel('Tile', fontsize=16)
+    ax.set_yticks(range(len(tile_names)))
+    ax.set_yticklabels(tile_names, fontsize=8)
+    fig.colorbar(image, ax=ax).set_label('Normalized Greyscale Average', fontsize=16)
+    fig.tight_layout(pad=1.0)
+
+    # Save the heatmap and its data next to the other graphs
+    output_dir = os.path.join(os.path.dirname(tile_filepath), 'Graphs')
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    fig.savefig(os.path.join(output_dir, f'tile_heatmap_{timestamp}.png'), dpi=200, transparent=True, bbox_inches='tight')
+
+    heatmap_data = pd.DataFrame(tiles, columns=tile_names)
+    heatmap_data.insert(0, 'Test Time (h)', test_time)
+    heatmap_data.insert(0, 'Timestamp', timestamps)
+    heatmap_data.to_csv(os.path.join(output_dir, f'tile_heatmap_{timestamp}.csv'), index=False)
+
+    plt.show()
+
+def select_tile_file():
+    filename = filedialog.askopenfilename(filetypes=[("Tile luminance files", "*_tiles.npz")])
+    if filename:
+        export_tile_heatmap(filename)
+
+class CycleCache:
+    # Least recently used cache of (time since cycle start, values) arrays, bounded by the total number of points
+    def __init__(self, max_points):
+        self.max_points = max_points
+        self.points = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.points -= len(self.entries.pop(key)[0])
+        self.entries[key] = value
+        self.points += len(value[0])
+        while self.points > self.max_points and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.points -= len(evicted[0])
+
+def find_test_files(folder):
+    # A test folder holds combined_data.csv, or one combined_data_<channel>.csv per channel
+    filepath = os.path.join(folder, 'combined_data.csv')
+    if os.path.isfile(filepath):
+        return [filepath]
+    return sorted(glob.glob(os.path.join(folder, 'combined_data_*.csv')))
+
+@lru_cache(maxsize=256)
+def read_cycle_indices(filepath, mtime):
+    import pandas as pd
+
+    # mtime is part of the cache key so a re-combined file is read again
+    return tuple(sorted(pd.read_csv(filepath, usecols=['Cycle_Index'])['Cycle_Index'].dropna().unique()))
+
+def load_aligned_cycles(cache, filepath, column, cycles):
+    import numpy as np
+    import pandas as pd
+
+    mtime = os.path.getmtime(filepath)
+    loaded = {cycle: cache.get((filepath, mtime, column, cycle)) for cycle in cycles}
+    missing = [cycle for cycle, entry in loaded.items() if entry is None]
+    if missing:
+        # Read only the columns needed, and only keep rows of cycles that are not cached yet
+        frames = []
+        for chunk in pd.read_csv(filepath, usecols=['Cycle_Index', 'Test Time (h)', column], chunksize=500000):
+            frames.append(chunk[chunk['Cycle_Index'].isin(missing)])
+        data = pd.concat(frames).sort_values(by='Test Time (h)', kind='stable')
+        groups = dict(list(data.groupby('Cycle_Index')))
+        for cycle in missing:
+            if cycle in groups:
+                test_time = groups[cycle]['Test Time (h)'].to_numpy(dtype=float)
+                entry = (test_time - test_time[0], groups[cycle][column].to_numpy(dtype=float))
+            else:
+                entry = (np.empty(0), np.empty(0))
+            cache.put((filepath, mtime, column, cycle), entry)
+            loaded[cycle] = entry
+    return loaded
+
+def downsample_min_max(x, y, max_points):
+    import numpy as np
+
+    # Keep the lowest and highest point of each bucket so peaks survive the downsampling
+    if len(x) <= max_points:
+        return x, y
+    buckets = max_points // 2
+    edges = np.linspace(0, len(x), buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    filled = np.nan_to_num(y, nan=np.inf)
+    order = np.lexsort((filled, bucket))
+    lowest = order[edges[:-1]]
+    filled = np.nan_to_num(y, nan=-np.inf)
+    order = np.lexsort((filled, bucket))
+    highest = order[edges[1:] - 1]
+    keep = np.unique(np.concatenate([lowest, highest]))
+    return x[keep], y[keep]
+
+def plot_comparison(tests, cycles, column, cache):
+    import matplotlib.pyplot as plt
+
+    setup_plot_styles()
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    colors = plt.get_cmap('tab10' if len(tests) <= 10 else 'tab20')
+    for test_number, (label, filepath) in enumerate(tests):
+        color = colors(test_number % colors.N)
+        aligned = load_aligned_cycles(cache, filepath, column, cycles)
+        labelled = False
+        for cycle in cycles:
+            time_since_start, values = aligned[cycle]
+            if len(time_since_start) == 0:
+                continue
+            time_since_start, values = downsample_min_max(time_since_start, values, comparison_points_per_cycle)
+            ax.plot(time_since_start, values, color=color, linewidth=1, label=None if labelled else label)
+            labelled = True
+
+    ax.set_xlabel('Time Since Cycle Start (h)', fontsize=16)
+    ax.set_ylabel(comparison_columns[column], fontsize=16)
+    ax.legend(fontsize=10)
+    fig.tight_layout(pad=1.0)
+
+    # Save next to the first test, like the single test plots
+    output_dir = os.path.join(os.path.dirname(tests[0][1]), 'Graphs')
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    fig.savefig(os.path.join(output_dir, f'comparison_{timestamp}.png'), dpi=200, transparent=True, bbox_inches='tight')
+
+    plt.show()
+
+def open_comparison_window(root):
+    window = Toplevel(root)
+    window.title("Compare Tests")
+
+    cache = CycleCache(comparison_cache_points)
+    tests = []
+    column = StringVar(value='Brightness_smooth')
+
+    test_frame = Frame(window)
+    test_frame.pack(side="left", fill="y", padx=10, pady=10)
+    Label(test_frame, text="Tests:").pack()
+    test_listbox = Listbox(test_frame, selectmode=MULTIPLE, exportselection=False, width=40)
+    test_listbox.pack(fill="y", expand=True)
+
+    cycle_frame = Frame(window)
+    cycle_frame.pack(side="left", fill="y", padx=10, pady=10)
+    Label(cycle_frame, text="Cycles:").pack()
+    cycle_listbox = Listbox(cycle_frame, selectmode=MULTIPLE, exportselection=False)
+    cycle_listbox.pack(side="left", fill="y")
+    cycle_scrollbar = Scrollbar(cycle_frame, orient="vertical", command=cycle_listbox.yview)
+    cycle_scrollbar.pack(side="left", fill="y")
+    cycle_listbox.config(yscrollcommand=cycle_scrollbar.set)
+
+    def update_comparison_cycles():
+        # Offer every cycle found in any of the tests, keeping the current selection
+        selected = {str(cycle_listbox.get(i)) for i in cycle_listbox.curselection()}
+        all_cycles = set()
+        for _, filepath in tests:
+            all_cycles.update(read_cycle_indices(filepath, os.path.getmtime(filepath)))
+        cycle_listbox.delete(0, END)
+        for cycle in sorted(all_cycles):
+            display_cycle = 'Rest' if cycle == 0 else int(cycle)
+            cycle_listbox.insert(END, display_cycle)
+            if str(display_cycle) in selected:
+                cycle_listbox.selection_set(END)
+
+    def add_test_folder():
+        folder = filedialog.askdirectory(title="Select Test Folder")
+        if not folder:
+            return
+        filepaths = find_test_files(folder)
+        if not filepaths:
+            messagebox.showerror("Error", f"No combined_data.csv found in {folder}.")
+            return
+        for filepath in filepaths:
+            name = os.path.splitext(os.path.basename(filepath))[0].replace('combined_data', '').strip('_')
+            label = os.path.basename(folder) + (f" ch{name}" if name else '')
+            tests.append((label, filepath))
+            test_listbox.insert(END, label)
+        update_comparison_cycles()
+
+    def remove_tests():
+        for i in reversed(test_listbox.curselection()):
+            test_listbox.delete(i)
+            del tests[i]
+        update_comparison_cycles()
+
+    def create_comparison_plot():
+        cycles = [int(cycle_listbox.get(i)) if cycle_listbox.get(i) != 'Rest' else 0 for i in cycle_listbox.curselection()]
+        if not tests or not cycles:
+            messagebox.showerror("Error", "Add at least one test folder and select cycles to compare.")
+            return
+        plot_comparison(tests, cycles, column.get(), cache)
+
+    options_frame = Frame(window)
+    options_frame.pack(side="left", fill="y", padx=10, pady=10)
+    Button(options_frame, text="Add Test Folder", command=add_test_folder).pack(pady=5)
+    Button(options_frame, text="Remove Selected", command=remove_tests).pack(pady=5)
+    Label(options_frame, text="Data to Compare:").pack(pady=10)
+    for value, text in [('Current(mA)_smooth', 'Current'), ('Brightness_smooth', 'Brightness'), ('Voltage(V)_smooth', 'Voltage'), ('Brightness Derivative_smooth', 'Derivative')]:
+        Radiobutton(options_frame, text=text, variable=column, value=value).pack(anchor="w")
+    Button(options_frame, text="Plot Comparison", command=create_comparison_plot).pack(pady=10)
+
 def select_file():
     filename = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
     if filename:
@@ -137,6 +380,8 @@ def select_file():
         update_cycles(filename)
 
 def update_cycles(filepath):
+    import pandas as pd
+
     data = pd.read_csv(filepath)
     unique_cycles = sorted(data['Cycle_Index'].unique())
     cycle_listbox.delete(0, END)
@@ -153,26 +398,46 @@ def create_plot():
     cycles = [int(cycle_listbox.get(i)) if cycle_listbox.get(i) != 'Rest' else 0 for i in selected_indices]
     main(selected_file.get(), cycles, plotcurrent, plotbright, plotvolt, plotderiv)
 
-# Add all GUI elements to the main window
-Label(root, text="Select a data file to begin:").pack(pady=10)
-Button(root, text="Select File", command=select_file).pack(pady=10)
-Label(root, textvariable=selected_file).pack(pady=10)
+if __name__ == "__main__":
+    # Create the main Tkinter window
+    root = Tk()
+    root.title("Data Plotter")
+
+    # Variables
+    plotcurrent = IntVar(value=1)
+    plotbright = IntVar(value=1)
+    plotvolt = IntVar()
+    plotderiv = IntVar()
+    plotcycles = []
+    selected_file = StringVar()
+
+    # Add all GUI elements to the main window
+    Label(root, text="Select a data file to begin:").pack(pady=10)
+    Button(root, text="Select File", command=select_file).pack(pady=10)
+    Label(root, textvariable=selected_file).pack(pady=10)
+
+    Label(root, text="Select Cycles:").pack()
+    cycle_listbox = Listbox(root, selectmode=MULTIPLE, exportselection=False)
+    cycle_listbox.pack(side="left", fill="y", padx=10)
 
-Label(root, text="Select Cycles:").pack()
-cycle_listbox = Listbox(root, selectmode=MULTIPLE, exportselection=False)
-cycle_listbox.pack(side="left", fill="y", padx=10)
+    scrollbar = Scrollbar(root, orient="vertical")
+    scrollbar.config(command=cycle_listbox.yview)
+    scrollbar.pack(side="left", fill="y")
+    cycle_listbox.config(yscrollcommand=scrollbar.set)
 
-scrollbar = Scrollbar(root, orient="vertical")
-scrollbar.config(command=cycle_listbox.yview)
-scrollbar.pack(side="left", fill="y")
-cycle_listbox.config(yscrollcommand=scrollbar.set)
+    Label(root, text="Select Data to Plot:").pack(pady=10)
+    Checkbutton(root, text="Current", variable=plotcurrent).pack()
+    Checkbutton(root, text="Brightness", variable=plotbright).pack()
+    Checkbutton(root, text="Voltage", variable=plotvolt).pack()
+    Checkbutton(root, text="Derivative", variable=plotderiv).pack()
 
-Label(root, text="Select Data to Plot:").pack(pady=10)
-Checkbutton(root, text="Current", variable=plotcurrent).pack()
-Checkbutton(root, text="Brightness", variable=plotbright).pack()
-Checkbutton(root, text="Voltage", variable=plotvolt).pack()
-Checkbutton(root, text="Derivative", variable=plotderiv).pack()
+    Button(root, text="Create Plot", command=create_plot).pack(pady=10)
+    Button(root, text="Tile Heatmap", command=select_tile_file).pack(pady=10)
+    Button(root, text="Compare Tests", command=lambda: open_comparison_window(root)).pack(pady=10)
 
-Button(root, text="Create Plot", command=create_plot).pack(pady=10)
+    # InterpolateData passes the combined data file on the command line
+    if len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
+        selected_file.set(sys.argv[1])
+        update_cycles(sys.argv[1])
 
-root.mainloop()
+    root.mainloop()
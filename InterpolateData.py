@@ -1,11 +1,26 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
-import pandas as pd
+import re
 import logging
-from scipy.signal import savgol_filter
 import subprocess
 
+# pandas, scipy and the process pool are imported inside the functions that need them so the GUI opens,
+# and the module can be imported as a library, without loading them until data is actually combined
+
+# Rows read per chunk when combining in streaming (low memory) mode
+stream_chunksize = 100000
+
+# How each echem column is interpolated onto the brightness timestamps, by the names shown in the GUI.
+# Smoothed columns follow the column they were smoothed from.
+interpolation_method_names = {'Linear': 'linear', 'Zero-order hold': 'previous', 'Nearest': 'nearest', 'Monotone cubic': 'pchip'}
+interpolation_methods = {'Voltage(V)': 'linear', 'Current(mA)': 'linear', 'Cycle_Index': 'previous'}
+interpolated_columns = ['Voltage(V)', 'Voltage(V)_smooth', 'Current(mA)', 'Current(mA)_smooth', 'Cycle_Index']
+
+# Frames between echem points more than this many seconds apart are flagged in an Interpolation Gap column
+# and left empty instead of interpolated (None to interpolate across any gap)
+max_interpolation_gap = None
+
 # Setting up logging
 logging.basicConfig(filename='data_merger.log', level=logging.DEBUG, format='%(asctime)s:%(levelname)s:%(message)s')
 
@@ -43,6 +58,8 @@ def ensure_echem_extract_exists(input_dir):
     return True
 
 def read_files(input_dir):
+    import pandas as pd
+
     try:
         if not ensure_echem_extract_exists(input_dir):
             return None, None
@@ -59,6 +76,9 @@ def read_files(input_dir):
             raise ValueError("Echem_Extract.csv does not have the required columns.")
         if not {'Timestamp', 'Luminance'}.issubset(image_data.columns):
             raise ValueError("image_luminance.csv does not have the required columns.")
+        if 'Channel' in echem_data.columns and echem_data['Channel'].nunique() > 1:
+            raise ValueError("Echem_Extract.csv contains several channels. Name the luminance files image_luminance_<channel>.csv to process each channel.")
+        image_data = add_tile_columns(image_data, load_tile_luminance(image_brightness_path))
         
         logging.info("Files read successfully.")
         return echem_data, image_data
@@ -67,19 +87,72 @@ def read_files(input_dir):
         messagebox.showerror("File Error", f"An error occurred while reading the files: {e}")
         return None, None
 
-def preprocess_data(echem_data, image_data):
-    try:
-        # Convert Timestamp to datetime
-        echem_data['Timestamp'] = pd.to_datetime(echem_data['Timestamp'])
-        image_data['Timestamp'] = pd.to_datetime(image_data['Timestamp'])
+def get_tile_filepath(image_path):
+    # BrightnessExtract saves per-tile luminance next to the CSV as <name>_tiles.npz when a tile grid is used
+    return os.path.splitext(image_path)[0] + '_tiles.npz'
 
-        # Normalize brightness data
-        image_data['Luminance'] = image_data['Luminance'] * 100 / 255
+def get_tile_column_names(rows, cols):
+    return [f'Tile_{row + 1}_{col + 1}' for row in range(rows) for col in range(cols)]
 
-        # Sort data by Timestamp
-        echem_data.sort_values(by='Timestamp', inplace=True)
-        image_data.sort_values(by='Timestamp', inplace=True)
-        
+def load_tile_luminance(image_path):
+    import numpy as np
+
+    tile_filepath = get_tile_filepath(image_path)
+    if not os.path.exists(tile_filepath):
+        return None
+    with np.load(tile_filepath) as tile_file:
+        timestamps = tile_file['timestamps']
+        tiles = tile_file['tiles']
+        rows, cols = tile_file['grid']
+    order = np.argsort(timestamps, kind='stable')
+    logging.info(f"Loaded {rows}x{cols} tile luminance for {len(timestamps)} images from {tile_filepath}.")
+    return timestamps[order], tiles[order], get_tile_column_names(rows, cols)
+
+def add_tile_columns(image_data, tile_luminance):
+    import numpy as np
+    import pandas as pd
+
+    if tile_luminance is None:
+        return image_data
+
+    # Match each frame to its tile row by exact capture time; frames without tiles get NaN
+    timestamps, tiles, columns = tile_luminance
+    if len(timestamps) == 0:
+        # The streaming merge can run out of tile rows before the frames end
+        tile_data = np.full((len(image_data), len(columns)), np.nan)
+    else:
+        frame_times = pd.to_datetime(image_data['Timestamp']).to_numpy(dtype=timestamps.dtype)
+        index = np.searchsorted(timestamps, frame_times).clip(max=len(timestamps) - 1)
+        found = timestamps[index] == frame_times
+        tile_data = np.where(found[:, np.newaxis], tiles[index], np.nan)
+    return pd.concat([image_data, pd.DataFrame(tile_data, columns=columns, index=image_data.index)], axis=1)
+
+def get_tile_columns(data):
+    return [column for column in data.columns if column.startswith('Tile_')]
+
+def normalize_luminance(image_data):
+    # Normalize brightness data
+    for column in ['Luminance'] + get_tile_columns(image_data):
+        image_data[column] = image_data[column] * 100 / 255
+    return image_data
+
+def normalize_and_sort(echem_data, image_data):
+    import pandas as pd
+
+    # Convert Timestamp to datetime
+    echem_data['Timestamp'] = pd.to_datetime(echem_data['Timestamp'])
+    image_data['Timestamp'] = pd.to_datetime(image_data['Timestamp'])
+
+    image_data = normalize_luminance(image_data)
+
+    # Sort data by Timestamp
+    echem_data.sort_values(by='Timestamp', inplace=True)
+    image_data.sort_values(by='Timestamp', inplace=True)
+    return echem_data, image_data
+
+def preprocess_data(echem_data, image_data):
+    try:
+        echem_data, image_data = normalize_and_sort(echem_data, image_data)
         logging.info("Data preprocessing successful.")
         return echem_data, image_data
     except Exception as e:
@@ -88,10 +161,13 @@ def preprocess_data(echem_data, image_data):
         return None, None
 
 def add_smoothed_column(data, num_points, column):
+    from scipy.signal import savgol_filter
+
     try:
         smoothed_column_name = f"{column}_smooth"
         if num_points > 0 and num_points % 2 != 0:  # num_points must be odd for Savitzky-Golay filter
-            data[smoothed_column_name] = savgol_filter(data[column], num_points, 2)
+            # The first brightness derivative has no previous point and is NaN, which the filter cannot take
+            data[smoothed_column_name] = savgol_filter(data[column].bfill(), num_points, 2)
             logging.info(f"Smoothing applied on {column} with {num_points} points and stored in {smoothed_column_name}.")
         else:
             data[smoothed_column_name] = data[column]  # if smoothing is not applicable, copy the original data
@@ -105,76 +181,169 @@ def convert_current_to_mA(echem_data):
     echem_data['Current(mA)'] = echem_data['Current(A)'] * 1000
     return echem_data
 
-def combine_data(echem_data, image_data):
+def smooth_inputs(echem_data, image_data, voltage_points, current_points, brightness_points):
+    # Convert current to mA before smoothing
+    echem_data = convert_current_to_mA(echem_data)
+
+    # Smooth echem and image data as specified
+    if voltage_points > 0:
+        echem_data = add_smoothed_column(echem_data, voltage_points, 'Voltage(V)')
+    if current_points > 0:
+        echem_data = add_smoothed_column(echem_data, current_points, 'Current(mA)')
+
+    if brightness_points > 0:
+        image_data = add_smoothed_column(image_data, brightness_points, 'Luminance')
+    return echem_data, image_data
+
+def check_interpolation(methods, max_gap):
+    for column, method in methods.items():
+        allowed = ('previous', 'nearest') if column == 'Cycle_Index' else tuple(interpolation_method_names.values())
+        if method not in allowed:
+            raise ValueError(f"Interpolation method {method} cannot be used for {column}.")
+    if max_gap is not None and max_gap <= 0:
+        raise ValueError("Maximum interpolation gap must be positive.")
+
+def pchip_end_slope(times, values, end, step):
+    import numpy as np
+
+    # One-sided slope at the first (step 1) or last (step -1) point, as scipy's PchipInterpolator uses
+    if len(values) < 3:
+        h = (times[-1] - times[0]) / 1e9
+        return (values[-1] - values[0]) / h if h > 0 else 0.0
+    h0 = abs(times[end + step] - times[end]) / 1e9
+    h1 = abs(times[end + 2 * step] - times[end + step]) / 1e9
+    m0 = (values[end + step] - values[end]) / ((times[end + step] - times[end]) / 1e9) if h0 > 0 else 0.0
+    m1 = (values[end + 2 * step] - values[end + step]) / ((times[end + 2 * step] - times[end + step]) / 1e9) if h1 > 0 else 0.0
+    if h0 + h1 == 0:
+        return 0.0
+    slope = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    if np.sign(slope) != np.sign(m0):
+        return 0.0
+    if np.sign(m0) != np.sign(m1) and abs(slope) > 3 * abs(m0):
+        return 3 * m0
+    return slope
+
+def pchip_slopes(times, values, knots, at_start, at_end):
+    import numpy as np
+
+    # Slopes of the monotone cubic (PCHIP) curve at the given echem rows. Each slope only depends on the
+    # neighbouring rows, so the streaming merge gets the same curve from its buffer as the in-memory path
+    # gets from the whole series. at_start and at_end say whether the first and last rows are the real ends.
+    last = len(values) - 1
+    before = np.clip(knots - 1, 0, last)
+    after = np.clip(knots + 1, 0, last)
+    h0 = (times[knots] - times[before]) / 1e9
+    h1 = (times[after] - times[knots]) / 1e9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m0 = np.where(h0 > 0, (values[knots] - values[before]) / h0, 0.0)
+        m1 = np.where(h1 > 0, (values[after] - values[knots]) / h1, 0.0)
+        w1 = 2 * h1 + h0
+        w2 = h1 + 2 * h0
+        # Weighted harmonic mean of the slopes on either side, flat where they differ in sign
+        slopes = np.where(m0 * m1 > 0, (w1 + w2) / (w1 / m0 + w2 / m1), 0.0)
+
+    if at_start:
+        slopes[knots == 0] = pchip_end_slope(times, values, 0, 1)
+    if at_end:
+        slopes[knots == last] = pchip_end_slope(times, values, last, -1)
+    return slopes
+
+def interpolate_echem(echem_data, echem_times, frame_times, past_index, future_index, methods, max_gap, at_start=True, at_end=True):
+    import numpy as np
+
+    # Each frame lies between the last echem row at or before it and the first at or after it, and every
+    # column is interpolated for all frames at once with the method chosen for it
+    previous = past_index - 1
+    following = future_index
+    t1 = echem_times[previous]
+    t2 = echem_times[following]
+    same_time = t1 == t2
+    time_fraction = ((frame_times - t1) / 1e9) / np.where(same_time, 1, (t2 - t1) / 1e9)
+
+    interpolated = {}
+    for column in interpolated_columns:
+        if column not in echem_data.columns:
+            continue
+        # Smoothed columns are interpolated the same way as the column they were smoothed from
+        method = methods[column.replace('_smooth', '')]
+        values = echem_data[column].to_numpy()
+        v1 = values[previous]
+        v2 = values[following]
+        if method == 'previous':
+            interpolated[column] = v1
+        elif method == 'nearest':
+            interpolated[column] = np.where(frame_times - t1 <= t2 - frame_times, v1, v2)
+        elif method == 'pchip':
+            values = values.astype(float)
+            d1 = pchip_slopes(echem_times, values, previous, at_start, at_end)
+            d2 = pchip_slopes(echem_times, values, following, at_start, at_end)
+            h = (t2 - t1) / 1e9
+            s = time_fraction
+            cubic = (v1 * (2 * s**3 - 3 * s**2 + 1) + h * d1 * (s**3 - 2 * s**2 + s)
+                     + v2 * (3 * s**2 - 2 * s**3) + h * d2 * (s**3 - s**2))
+            interpolated[column] = np.where(same_time, v1, cubic)
+        else:
+            interpolated[column] = np.where(same_time, v1, v1 + (v2 - v1) * time_fraction)
+
+    # Frames between echem rows further apart than the maximum gap are flagged and left empty
+    gap = None
+    if max_gap is not None:
+        gap = (t2 - t1) / 1e9 > max_gap
+        for column in interpolated:
+            if column != 'Cycle_Index':
+                interpolated[column] = np.where(gap, np.nan, interpolated[column])
+    return interpolated, gap
+
+def build_combined_frame(frames, valid, interpolated, gap, test_time):
+    import pandas as pd
+
+    combined_df = pd.DataFrame({
+        'Timestamp': frames['Timestamp'].to_numpy()[valid],
+        'Brightness': frames['Luminance'].to_numpy()[valid],
+        'Brightness_smooth': frames['Luminance_smooth'].to_numpy()[valid],
+        **interpolated,
+        'Test Time (h)': test_time
+    })
+    if gap is not None:
+        combined_df['Interpolation Gap'] = gap
+    for column in get_tile_columns(frames):
+        combined_df[column] = frames[column].to_numpy()[valid]
+    return combined_df
+
+def log_skipped_frames(frame_timestamps):
+    if len(frame_timestamps):
+        logging.warning(f"No echem data on both sides of {len(frame_timestamps)} brightness timestamps from {frame_timestamps.iloc[0]} to {frame_timestamps.iloc[-1]}. Skipping these points.")
+
+def interpolate_frames(echem_data, image_data, methods=None, max_gap=None):
+    import numpy as np
+
+    methods = interpolation_methods if methods is None else methods
+    max_gap = max_interpolation_gap if max_gap is None else max_gap
+
+    # Both inputs are sorted by time, so the echem rows around every frame come from two binary searches
+    echem_times = echem_data['Timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+    image_times = image_data['Timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+    past_index = np.searchsorted(echem_times, image_times, side='right')
+    future_index = np.searchsorted(echem_times, image_times, side='left')
+
+    # Skip frames outside the echem data, where there is nothing to interpolate between
+    valid = (past_index >= 1) & (future_index < len(echem_times))
+    log_skipped_frames(image_data['Timestamp'][~valid])
+
+    interpolated, gap = interpolate_echem(echem_data, echem_times, image_times[valid], past_index[valid], future_index[valid], methods, max_gap)
+
+    # Calculate test time in hours from the first brightness frame
+    test_time = (image_times[valid] - image_times.min()) / 1e9 / 3600
+    combined_df = build_combined_frame(image_data, valid, interpolated, gap, test_time)
+
+    # Add the derivative of brightness from the smoothed brightness data
+    combined_df['Brightness Derivative'] = combined_df['Brightness_smooth'].diff() / combined_df['Test Time (h)'].diff()
+
+    return combined_df
+
+def combine_data(echem_data, image_data, methods=None, max_gap=None):
     try:
-        # Initialize a list to hold combined data
-        combined_data = []
-
-        for _, row in image_data.iterrows():
-            brightness_time = row['Timestamp']
-            brightness_value = row['Luminance']
-            brightness_smooth_value = row['Luminance_smooth']
-
-            # Find the closest two voltage data points
-            past_points = echem_data[echem_data['Timestamp'] <= brightness_time]
-            future_points = echem_data[echem_data['Timestamp'] >= brightness_time]
-
-            if (past_points.empty or future_points.empty) or (past_points.shape[0] < 2 or future_points.shape[0] < 2):
-                # Skip if there are no valid previous or next points
-                logging.warning(f"No valid interpolation points found for brightness timestamp {brightness_time}. Skipping this point.")
-                continue
-
-            previous_point = past_points.iloc[-1]
-            next_point = future_points.iloc[0]
-
-            # Linear interpolation
-            t1 = previous_point['Timestamp']
-            t2 = next_point['Timestamp']
-            v1 = previous_point['Voltage(V)']
-            v2 = next_point['Voltage(V)']
-            i1 = previous_point['Current(mA)']
-            i2 = next_point['Current(mA)']
-            vi_smooth1 = previous_point['Voltage(V)_smooth']
-            vi_smooth2 = next_point['Voltage(V)_smooth']
-            ci_smooth1 = previous_point['Current(mA)_smooth']
-            ci_smooth2 = next_point['Current(mA)_smooth']
-            c_index = previous_point['Cycle_Index']
-            
-            if t1 == t2:
-                voltage_interpolated = v1
-                current_interpolated = i1
-                voltage_smoothed_interpolated = vi_smooth1
-                current_smoothed_interpolated = ci_smooth1
-            else:
-                # Calculate the interpolated values
-                total_time = (t2 - t1).total_seconds()  # in seconds
-                time_fraction = (brightness_time - t1).total_seconds() / total_time
-
-                voltage_interpolated = v1 + (v2 - v1) * time_fraction
-                current_interpolated = i1 + (i2 - i1) * time_fraction
-                voltage_smoothed_interpolated = vi_smooth1 + (vi_smooth2 - vi_smooth1) * time_fraction
-                current_smoothed_interpolated = ci_smooth1 + (ci_smooth2 - ci_smooth1) * time_fraction
-            
-            # Calculate test time in hours from the first combined data point
-            test_time = (brightness_time - image_data['Timestamp'].min()).total_seconds() / 3600
-
-            combined_data.append({
-                'Timestamp': brightness_time,
-                'Brightness': brightness_value,
-                'Brightness_smooth': brightness_smooth_value,
-                'Voltage(V)': voltage_interpolated,
-                'Voltage(V)_smooth': voltage_smoothed_interpolated,
-                'Current(mA)': current_interpolated,
-                'Current(mA)_smooth': current_smoothed_interpolated,
-                'Cycle_Index': c_index,
-                'Test Time (h)': test_time
-            })
-        
-        combined_df = pd.DataFrame(combined_data)
-
-        # Add the derivative of brightness from the smoothed brightness data
-        combined_df['Brightness Derivative'] = combined_df['Brightness_smooth'].diff() / combined_df['Test Time (h)'].diff()
-        
+        combined_df = interpolate_frames(echem_data, image_data, methods, max_gap)
         logging.info("Data combination successful.")
         return combined_df
     except Exception as e:
@@ -193,6 +362,335 @@ def save_combined_data(combined_df, output_dir):
         logging.error(f"Error in saving combined data: {e}")
         messagebox.showerror("Save Error", f"An error occurred while saving the combined data: {e}")
 
+def read_time_sorted_chunks(filepath, chunksize, required_columns, channel=None):
+    import pandas as pd
+
+    filename = os.path.basename(filepath)
+    last_time = None
+    first_channel = None
+    for chunk in pd.read_csv(filepath, chunksize=chunksize):
+        if not required_columns.issubset(chunk.columns):
+            raise ValueError(f"{filename} does not have the required columns.")
+        if channel is not None:
+            if 'Channel' not in chunk.columns:
+                raise ValueError(f"{filename} has no Channel column.")
+            chunk = chunk[chunk['Channel'] == channel].reset_index(drop=True)
+        elif 'Channel' in chunk.columns and not chunk.empty:
+            # Same check as read_files; each channel is only sorted within itself, so this has to come first
+            if first_channel is None:
+                first_channel = chunk['Channel'].iloc[0]
+            if (chunk['Channel'] != first_channel).any():
+                raise ValueError(f"{filename} contains several channels. Name the luminance files image_luminance_<channel>.csv to process each channel.")
+
+        chunk['Timestamp'] = pd.to_datetime(chunk['Timestamp'])
+        if not chunk['Timestamp'].is_monotonic_increasing or (last_time is not None and not chunk.empty and chunk['Timestamp'].iloc[0] < last_time):
+            raise ValueError(f"{filename} must be sorted by Timestamp to be streamed.")
+        if not chunk.empty:
+            last_time = chunk['Timestamp'].iloc[-1]
+        yield chunk
+
+def smooth_chunks(chunks, num_points, column):
+    import numpy as np
+    import pandas as pd
+    from scipy.signal import savgol_filter
+
+    smoothed_column_name = f"{column}_smooth"
+    if not (num_points > 0 and num_points % 2 != 0):
+        logging.warning(f"Smoothing points for {column} must be a positive odd number. No smoothing applied.")
+        for chunk in chunks:
+            chunk[smoothed_column_name] = chunk[column]
+            yield chunk
+        return
+
+    # A row can only be smoothed once the half window after it has been read. The last window's worth of
+    # rows already written is kept as context, both for the half window before the next rows and for the
+    # polynomial fit at the end of the data, so every value matches add_smoothed_column.
+    half_window = num_points // 2
+    context = np.empty(0)
+    pending = None
+    for chunk in chunks:
+        pending = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+        window = np.concatenate([context, pending[column].bfill().to_numpy(dtype=float)])
+        ready = len(pending) - half_window
+        if len(window) < num_points or ready <= 0:
+            continue
+
+        offset = len(context)
+        smoothed = savgol_filter(window, num_points, 2)
+        output = pending.iloc[:ready].copy()
+        output[smoothed_column_name] = smoothed[offset:offset + ready]
+        context = window[max(offset + ready - (num_points - 1), 0):offset + ready]
+        pending = pending.iloc[ready:].reset_index(drop=True)
+        yield output
+
+    if pending is not None and not pending.empty:
+        window = np.concatenate([context, pending[column].bfill().to_numpy(dtype=float)])
+        output = pending.copy()
+        output[smoothed_column_name] = savgol_filter(window, num_points, 2)[len(context):]
+        yield output
+    logging.info(f"Smoothing applied on {column} with {num_points} points and stored in {smoothed_column_name}.")
+
+def read_npy_header(file):
+    import numpy as np
+
+    version = np.lib.format.read_magic(file)
+    read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+    shape, fortran_order, dtype = read_header(file)
+    if fortran_order:
+        raise ValueError("Tile luminance arrays must be stored in row-major order.")
+    return shape, dtype
+
+def read_tile_blocks(tile_filepath, chunksize):
+    import zipfile
+    import numpy as np
+
+    # Reads the timestamps and tiles arrays out of the npz a block of rows at a time, so the frames x tiles
+    # array is never loaded whole
+    with zipfile.ZipFile(tile_filepath) as archive, archive.open('timestamps.npy') as timestamp_file, archive.open('tiles.npy') as tiles_file:
+        (num_frames,), timestamp_dtype = read_npy_header(timestamp_file)
+        (_, num_tiles), tiles_dtype = read_npy_header(tiles_file)
+        for start in range(0, num_frames, chunksize):
+            count = min(chunksize, num_frames - start)
+            timestamps = np.frombuffer(timestamp_file.read(count * timestamp_dtype.itemsize), dtype=timestamp_dtype)
+            tiles = np.frombuffer(tiles_file.read(count * num_tiles * tiles_dtype.itemsize), dtype=tiles_dtype).reshape(count, num_tiles)
+            yield timestamps, tiles
+
+def add_tile_columns_chunks(image_chunks, image_path, chunksize):
+    import numpy as np
+
+    # Streaming counterpart of load_tile_luminance and add_tile_columns: a merge-join of the time-sorted
+    # frames with the tile rows, which BrightnessExtract also writes sorted by time, holding only the tile
+    # rows from the current chunk onwards
+    tile_filepath = get_tile_filepath(image_path)
+    if not os.path.exists(tile_filepath):
+        yield from image_chunks
+        return
+    with np.load(tile_filepath) as tile_file:
+        rows, cols = tile_file['grid']
+    columns = get_tile_column_names(rows, cols)
+
+    tile_blocks = read_tile_blocks(tile_filepath, chunksize)
+    tile_times = np.empty(0, dtype='datetime64[us]')
+    tiles = np.empty((0, rows * cols), dtype='float32')
+    tiles_exhausted = False
+    for chunk in image_chunks:
+        if chunk.empty:
+            yield add_tile_columns(chunk, (tile_times, tiles, columns))
+            continue
+        last_frame_time = np.datetime64(chunk['Timestamp'].iloc[-1])
+
+        # Read tile rows until they pass the last frame of the chunk
+        while not tiles_exhausted and (len(tile_times) == 0 or tile_times[-1] <= last_frame_time):
+            block = next(tile_blocks, None)
+            if block is None:
+                tiles_exhausted = True
+                break
+            tile_times = np.concatenate([tile_times, block[0]])
+            tiles = np.concatenate([tiles, block[1]])
+
+        yield add_tile_columns(chunk, (tile_times, tiles, columns))
+
+        # Later frames are at or after the last one, so earlier tile rows are no longer needed
+        keep_from = np.searchsorted(tile_times, last_frame_time, side='left')
+        tile_times = tile_times[keep_from:]
+        tiles = tiles[keep_from:]
+
+def first_needed_echem_row(echem_times, brightness_time):
+    import numpy as np
+
+    # Keep the last point before the brightness timestamp and every point at it, since later frames may use them,
+    # plus the point before those for the monotone cubic slope there
+    last_before = np.searchsorted(echem_times, brightness_time, side='right') - 1
+    first_at = np.searchsorted(echem_times, brightness_time, side='left')
+    return max(min(last_before, first_at) - 1, 0)
+
+def merge_interpolate_chunks(echem_chunks, image_chunks, methods=None, max_gap=None):
+    import numpy as np
+    import pandas as pd
+
+    methods = interpolation_methods if methods is None else methods
+    max_gap = max_interpolation_gap if max_gap is None else max_gap
+
+    # Two-pointer merge-join over time-sorted chunks. The echem buffer only holds rows from the one before the
+    # last one at or before the next brightness timestamp up to the read position, which is all the monotone
+    # cubic slopes need, and dropped rows are counted to tell whether the buffer starts at the first echem row.
+    echem_buffer = None
+    echem_times = np.empty(0, dtype='int64')
+    echem_dropped = 0
+    echem_exhausted = False
+    image_pending = None
+    first_image_time = None
+    previous_brightness = np.empty(0)
+    previous_test_time = np.empty(0)
+
+    while True:
+        if image_pending is None or image_pending.empty:
+            image_pending = next(image_chunks, None)
+            if image_pending is None:
+                break
+            if first_image_time is None and not image_pending.empty:
+                first_image_time = image_pending['Timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')[0]
+            continue
+        image_times = image_pending['Timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+        # Read more echem data until there are two points at or after the next brightness timestamp
+        if not echem_exhausted and (len(echem_times) < 2 or image_times[0] > echem_times[-2]):
+            chunk = next(echem_chunks, None)
+            if chunk is None:
+                echem_exhausted = True
+                continue
+            echem_buffer = chunk if echem_buffer is None else pd.concat([echem_buffer, chunk], ignore_index=True)
+            echem_times = echem_buffer['Timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+            keep_from = first_needed_echem_row(echem_times, image_times[0])
+            echem_dropped += keep_from
+            echem_buffer = echem_buffer.iloc[keep_from:].reset_index(drop=True)
+            echem_times = echem_times[keep_from:]
+            continue
+
+        ready = len(image_times) if echem_exhausted else np.searchsorted(image_times, echem_times[-2], side='right')
+        frames = image_pending.iloc[:ready]
+        frame_times = image_times[:ready]
+        image_pending = image_pending.iloc[ready:].reset_index(drop=True)
+
+        past_index = np.searchsorted(echem_times, frame_times, side='right')
+        future_index = np.searchsorted(echem_times, frame_times, side='left')
+        valid = (past_index >= 1) & (future_index < len(echem_times))
+        log_skipped_frames(frames['Timestamp'][~valid])
+
+        if valid.any():
+            t = frame_times[valid]
+            interpolated, gap = interpolate_echem(echem_buffer, echem_times, t, past_index[valid], future_index[valid],
+                                                  methods, max_gap, echem_dropped == 0, echem_exhausted)
+            brightness_smooth = frames['Luminance_smooth'].to_numpy()[valid]
+            test_time = (t - first_image_time) / 1e9 / 3600
+            combined_df = build_combined_frame(frames, valid, interpolated, gap, test_time)
+
+            # Add the derivative of brightness, carrying the last row over from the previous chunk
+            brightness_with_previous = np.concatenate([previous_brightness, brightness_smooth])
+            test_time_with_previous = np.concatenate([previous_test_time, test_time])
+            derivative = np.diff(brightness_with_previous) / np.diff(test_time_with_previous)
+            if len(previous_brightness) == 0:
+                derivative = np.concatenate([[np.nan], derivative])
+            combined_df['Brightness Derivative'] = derivative
+            previous_brightness = brightness_smooth[-1:]
+            previous_test_time = test_time[-1:]
+            yield combined_df
+
+        keep_from = first_needed_echem_row(echem_times, frame_times[-1])
+        echem_dropped += keep_from
+        echem_buffer = echem_buffer.iloc[keep_from:].reset_index(drop=True) if echem_buffer is not None else None
+        echem_times = echem_times[keep_from:]
+
+def stream_combine_files(echem_path, image_path, output_path, smoothing_points, chunksize, channel=None, methods=None, max_gap=None):
+    # Out-of-core version of the in-memory pipeline: both inputs must already be sorted by Timestamp, and
+    # memory stays bounded by the chunk size plus the smoothing windows
+    voltage_points, current_points, brightness_points, brightness_derivative_points = smoothing_points
+
+    echem_chunks = read_time_sorted_chunks(echem_path, chunksize, {'Timestamp', 'Voltage(V)', 'Current(A)', 'Cycle_Index'}, channel)
+    echem_chunks = (convert_current_to_mA(chunk) for chunk in echem_chunks)
+    if voltage_points > 0:
+        echem_chunks = smooth_chunks(echem_chunks, voltage_points, 'Voltage(V)')
+    if current_points > 0:
+        echem_chunks = smooth_chunks(echem_chunks, current_points, 'Current(mA)')
+
+    image_chunks = read_time_sorted_chunks(image_path, chunksize, {'Timestamp', 'Luminance'})
+    image_chunks = add_tile_columns_chunks(image_chunks, image_path, chunksize)
+    image_chunks = (normalize_luminance(chunk) for chunk in image_chunks)
+    if brightness_points > 0:
+        image_chunks = smooth_chunks(image_chunks, brightness_points, 'Luminance')
+
+    combined_chunks = merge_interpolate_chunks(echem_chunks, image_chunks, methods, max_gap)
+    if brightness_derivative_points > 0:
+        combined_chunks = smooth_chunks(combined_chunks, brightness_derivative_points, 'Brightness Derivative')
+
+    rows_written = 0
+    with open(output_path, mode='w', newline='') as file:
+        for chunk in combined_chunks:
+            if chunk.empty:
+                continue
+            # A fixed timestamp format keeps every chunk consistent, whatever precision its own rows need
+            chunk.to_csv(file, index=False, header=rows_written == 0, date_format='%Y-%m-%d %H:%M:%S.%f')
+            rows_written += len(chunk)
+
+    if rows_written == 0:
+        raise ValueError("No brightness timestamps could be interpolated.")
+    logging.info(f"Streamed {rows_written} combined rows to {output_path}.")
+    return output_path
+
+def find_channel_luminance_files(input_dir):
+    # Multi-cell tests provide one luminance file per cycler channel, named image_luminance_<channel>.csv
+    channel_files = {}
+    for filename in os.listdir(input_dir):
+        match = re.match(r'^image_luminance_(\d+)\.csv$', filename)
+        if match:
+            channel_files[int(match.group(1))] = os.path.join(input_dir, filename)
+    return dict(sorted(channel_files.items()))
+
+def process_channel(channel, echem_data, image_path, output_path, smoothing_points, methods=None, max_gap=None):
+    import pandas as pd
+
+    # Runs in a worker process, so errors are raised back to the caller instead of shown in a dialog
+    voltage_points, current_points, brightness_points, brightness_derivative_points = smoothing_points
+
+    image_data = pd.read_csv(image_path)
+    if not {'Timestamp', 'Luminance'}.issubset(image_data.columns):
+        raise ValueError(f"{os.path.basename(image_path)} does not have the required columns.")
+    image_data = add_tile_columns(image_data, load_tile_luminance(image_path))
+
+    echem_data, image_data = normalize_and_sort(echem_data, image_data)
+    echem_data, image_data = smooth_inputs(echem_data, image_data, voltage_points, current_points, brightness_points)
+    combined_df = interpolate_frames(echem_data, image_data, methods, max_gap)
+    if brightness_derivative_points > 0:
+        combined_df = add_smoothed_column(combined_df, brightness_derivative_points, 'Brightness Derivative')
+
+    combined_df.to_csv(output_path, index=False)
+    logging.info(f"Channel {channel} combined data saved successfully to {output_path}.")
+    return output_path
+
+def combine_channels(input_dir, channel_files, smoothing_points, chunksize=None, methods=None, max_gap=None):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    echem_path = os.path.join(input_dir, 'Echem_Extract.csv')
+    jobs = []
+    if chunksize:
+        # Each worker streams its own channel out of Echem_Extract.csv rather than loading it here
+        for channel, image_path in channel_files.items():
+            output_path = os.path.join(input_dir, f'combined_data_{channel}.csv')
+            jobs.append((channel, stream_combine_files, (echem_path, image_path, output_path, smoothing_points, chunksize, channel, methods, max_gap)))
+    else:
+        import pandas as pd
+
+        echem_data = pd.read_csv(echem_path)
+        if 'Channel' not in echem_data.columns:
+            raise ValueError("Echem_Extract.csv has no Channel column. Delete it and rerun to extract per-channel data.")
+
+        echem_channels = {channel: data.drop(columns='Channel') for channel, data in echem_data.groupby('Channel')}
+        for channel, image_path in channel_files.items():
+            if channel not in echem_channels:
+                logging.warning(f"No echem data found for channel {channel}, skipping {image_path}.")
+                continue
+            output_path = os.path.join(input_dir, f'combined_data_{channel}.csv')
+            jobs.append((channel, process_channel, (channel, echem_channels[channel], image_path, output_path, smoothing_points, methods, max_gap)))
+
+    if not jobs:
+        raise ValueError("No luminance files matched a channel in Echem_Extract.csv.")
+
+    output_paths = {}
+    errors = {}
+    num_workers = min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(function, *args): channel for channel, function, args in jobs}
+
+        for future in as_completed(futures):
+            channel = futures[future]
+            try:
+                output_paths[channel] = future.result()
+            except Exception as exc:
+                logging.error(f"Error in combining data for channel {channel}: {exc}")
+                errors[channel] = exc
+
+    return dict(sorted(output_paths.items())), errors
+
 def select_directory(directory_label):
     input_dir = filedialog.askdirectory()
     if input_dir:
@@ -200,7 +698,7 @@ def select_directory(directory_label):
         directory_label.config(text=f"Selected Directory: {input_dir}")
     return input_dir
 
-def combine_data_process(voltage_entry, current_entry, brightness_entry, brightness_derivative_entry, input_dir):
+def combine_data_process(voltage_entry, current_entry, brightness_entry, brightness_derivative_entry, input_dir, streaming=False, method_vars=None, max_gap_entry=None):
     if not input_dir:
         messagebox.showerror("Directory Error", "Please select a directory first.")
         return
@@ -218,7 +716,44 @@ def combine_data_process(voltage_entry, current_entry, brightness_entry, brightn
         messagebox.showerror("Input Error", "Number of smoothing points must be non-negative.")
         return
 
+    smoothing_points = (voltage_points, current_points, brightness_points, brightness_derivative_points)
+    chunksize = stream_chunksize if streaming else None
+
+    methods = {column: interpolation_method_names[var.get()] for column, var in method_vars.items()} if method_vars else interpolation_methods
     try:
+        max_gap_text = max_gap_entry.get().strip() if max_gap_entry else ''
+        max_gap = float(max_gap_text) if max_gap_text else max_interpolation_gap
+        check_interpolation(methods, max_gap)
+    except ValueError as e:
+        messagebox.showerror("Input Error", f"Invalid interpolation settings: {e}")
+        return
+
+    try:
+        channel_files = find_channel_luminance_files(input_dir)
+        if channel_files:
+            if not ensure_echem_extract_exists(input_dir):
+                return
+            output_paths, errors = combine_channels(input_dir, channel_files, smoothing_points, chunksize, methods, max_gap)
+            if errors:
+                failed = "\n".join(f"Channel {channel}: {error}" for channel, error in sorted(errors.items()))
+                messagebox.showerror("Data Error", f"An error occurred during data combination:\n{failed}")
+            if output_paths:
+                saved = "\n".join(output_paths.values())
+                messagebox.showinfo("Success", f"Combined data saved successfully to:\n{saved}")
+                # The graph button opens the first channel; the others can be opened from the plotter
+                return next(iter(output_paths.values()))
+            return
+
+        if streaming:
+            if not ensure_echem_extract_exists(input_dir):
+                return
+            echem_path = os.path.join(input_dir, 'Echem_Extract.csv')
+            image_brightness_path = os.path.join(input_dir, 'image_luminance.csv')
+            output_path = os.path.join(input_dir, 'combined_data.csv')
+            combined_filepath = stream_combine_files(echem_path, image_brightness_path, output_path, smoothing_points, chunksize, None, methods, max_gap)
+            messagebox.showinfo("Success", f"Combined data saved successfully to {combined_filepath}.")
+            return combined_filepath
+
         echem_data, image_data = read_files(input_dir)
         if echem_data is None or image_data is None:
             return
@@ -227,20 +762,10 @@ def combine_data_process(voltage_entry, current_entry, brightness_entry, brightn
         if echem_data is None or image_data is None:
             return
 
-        # Convert current to mA before smoothing
-        echem_data = convert_current_to_mA(echem_data)
-
-        # Smooth echem and image data as specified
-        if voltage_points > 0:
-            echem_data = add_smoothed_column(echem_data, voltage_points, 'Voltage(V)')
-        if current_points > 0:
-            echem_data = add_smoothed_column(echem_data, current_points, 'Current(mA)')
-
-        if brightness_points > 0:
-            image_data = add_smoothed_column(image_data, brightness_points, 'Luminance')
+        echem_data, image_data = smooth_inputs(echem_data, image_data, voltage_points, current_points, brightness_points)
 
         # Combine data
-        combined_df = combine_data(echem_data, image_data)
+        combined_df = combine_data(echem_data, image_data, methods, max_gap)
         if combined_df is None:
             return
 
@@ -256,6 +781,33 @@ def combine_data_process(voltage_entry, current_entry, brightness_entry, brightn
         logging.error(f"Error in data processing: {e}")
         messagebox.showerror("Processing Error", f"An error occurred during data processing: {e}")
 
+def open_smoothing_preview(root, input_dir, smoothing_entries):
+    if not input_dir:
+        messagebox.showerror("Directory Error", "Please select a directory first.")
+        return
+
+    if find_channel_luminance_files(input_dir) and not os.path.exists(os.path.join(input_dir, 'image_luminance.csv')):
+        messagebox.showerror("Preview Error", "The smoothing preview needs a single image_luminance.csv and cannot open per-channel luminance files.")
+        return
+
+    try:
+        # Load and preprocess once; the preview then only recomputes the smoothing as the entries change
+        echem_data, image_data = read_files(input_dir)
+        if echem_data is None or image_data is None:
+            return
+
+        echem_data, image_data = preprocess_data(echem_data, image_data)
+        if echem_data is None or image_data is None:
+            return
+        echem_data = convert_current_to_mA(echem_data)
+
+        from SmoothingPreview import SmoothingPreview
+        SmoothingPreview(root, echem_data, image_data, smoothing_entries)
+        logging.info(f"Opened smoothing preview for {input_dir}.")
+    except Exception as e:
+        logging.error(f"Error in opening smoothing preview: {e}")
+        messagebox.showerror("Preview Error", f"An error occurred while opening the smoothing preview: {e}")
+
 def create_graph(combined_filepath):
     try:
         if combined_filepath and os.path.isfile(combined_filepath):
@@ -267,6 +819,38 @@ def create_graph(combined_filepath):
         logging.error(f"Error in creating graph: {e}")
         messagebox.showerror("Graph Error", f"An error occurred while creating the graph: {e}")
 
+def find_channel_combined_files(combined_filepath):
+    # A per-channel combined_data_<channel>.csv stands for every channel combined into the same folder
+    if not re.match(r'^combined_data_\d+\.csv$', os.path.basename(combined_filepath)):
+        return [combined_filepath]
+    input_dir = os.path.dirname(combined_filepath)
+    channel_files = {}
+    for filename in os.listdir(input_dir or '.'):
+        match = re.match(r'^combined_data_(\d+)\.csv$', filename)
+        if match:
+            channel_files[int(match.group(1))] = os.path.join(input_dir, filename)
+    return list(dict(sorted(channel_files.items())).values())
+
+def analyze_lag(combined_filepath):
+    from CycleLagAnalysis import get_cycle_lag_filepath
+
+    try:
+        if combined_filepath and os.path.isfile(combined_filepath):
+            lag_filepaths = []
+            for filepath in find_channel_combined_files(combined_filepath):
+                result = subprocess.run(['python', 'CycleLagAnalysis.py', filepath], capture_output=True, text=True)
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr)
+                lag_filepaths.append(get_cycle_lag_filepath(filepath))
+                logging.info(f"Cycle lag analysis saved to {lag_filepaths[-1]}.")
+            saved = "\n".join(lag_filepaths)
+            messagebox.showinfo("Success", f"Cycle lag analysis saved to:\n{saved}")
+        else:
+            raise FileNotFoundError(f"The file {combined_filepath} was not found.")
+    except Exception as e:
+        logging.error(f"Error in analyzing cycle lag: {e}")
+        messagebox.showerror("Analysis Error", f"An error occurred while analyzing the cycle lag: {e}")
+
 def main():
     # Create the GUI window
     root = tk.Tk()
@@ -320,12 +904,51 @@ def main():
     brightness_derivative_entry.pack(side=tk.LEFT)
     brightness_derivative_entry.insert(0, "41")
     
+    preview_button = tk.Button(root, text="Preview Smoothing", command=lambda: open_smoothing_preview(
+        root, input_dir.get(), [voltage_entry, current_entry, brightness_entry, brightness_derivative_entry]))
+    preview_button.pack(pady=10)
+
+    # Interpolation method for each echem column; the cycle index can only be held or taken from the nearest point
+    method_labels = {value: name for name, value in interpolation_method_names.items()}
+    method_vars = {}
+    for column, text, choices in [
+        ('Voltage(V)', "Voltage interpolation:", list(interpolation_method_names)),
+        ('Current(mA)', "Current interpolation:", list(interpolation_method_names)),
+        ('Cycle_Index', "Cycle index interpolation:", ['Zero-order hold', 'Nearest'])
+    ]:
+        method_frame = tk.Frame(root)
+        method_frame.pack(pady=5)
+        method_label = tk.Label(method_frame, text=text)
+        method_label.pack(side=tk.LEFT)
+        method_vars[column] = tk.StringVar(value=method_labels[interpolation_methods[column]])
+        method_menu = tk.OptionMenu(method_frame, method_vars[column], *choices)
+        method_menu.pack(side=tk.LEFT)
+
+    # Frame for the maximum interpolation gap input
+    max_gap_frame = tk.Frame(root)
+    max_gap_frame.pack(pady=5)
+    max_gap_label = tk.Label(max_gap_frame, text="Max interpolation gap in seconds (blank for no limit):")
+    max_gap_label.pack(side=tk.LEFT)
+    max_gap_entry = tk.Entry(max_gap_frame)
+    max_gap_entry.pack(side=tk.LEFT)
+    if max_interpolation_gap is not None:
+        max_gap_entry.insert(0, str(max_interpolation_gap))
+
+    # Streaming mode reads the time-sorted CSV files in chunks for tests too large to load into memory
+    streaming = tk.IntVar(value=0)
+    streaming_check = tk.Checkbutton(root, text="Stream data from disk (low memory, inputs must be sorted by time)", variable=streaming)
+    streaming_check.pack(pady=5)
+
     combine_button = tk.Button(root, text="Combine Data", command=lambda: combined_filepath.set(combine_data_process(
-        voltage_entry, current_entry, brightness_entry, brightness_derivative_entry, input_dir.get())))
+        voltage_entry, current_entry, brightness_entry, brightness_derivative_entry, input_dir.get(), streaming.get() == 1,
+        method_vars, max_gap_entry)))
     combine_button.pack(pady=10)
     
     create_graph_button = tk.Button(root, text="Create Graph", command=lambda: create_graph(combined_filepath.get()))
     create_graph_button.pack(pady=10)
+
+    analyze_lag_button = tk.Button(root, text="Analyze Lag", command=lambda: analyze_lag(combined_filepath.get()))
+    analyze_lag_button.pack(pady=10)
     
     root.mainloop()
 
@@ -0,0 +1,236 @@
+import logging
+import queue
+import threading
+import tkinter as tk
+
+# Live preview of the Savitzky-Golay smoothing chosen in InterpolateData. The data is loaded once, and each
+# trace is only evaluated at a fixed set of decimated points, so a change of window only costs a few
+# thousand filter evaluations instead of a full Combine Data run.
+
+# Points drawn per trace
+preview_points = 2000
+
+# Wait this long after the last keystroke before recomputing
+debounce_ms = 50
+
+# Positions evaluated per block, to bound the memory of the filter windows
+block_size = 10000
+
+def decimate_positions(length, max_points):
+    import numpy as np
+
+    return np.unique(np.linspace(0, length - 1, min(length, max_points)).astype(int))
+
+def savgol_at(values_at, length, num_points, positions):
+    import numpy as np
+    from scipy.signal import savgol_coeffs, savgol_filter
+
+    # Same result as savgol_filter(values, num_points, 2) at the given positions only: a dot product with the
+    # filter coefficients in the interior, and the polynomial fit over the first or last window at the edges
+    half_window = num_points // 2
+    coeffs = savgol_coeffs(num_points, 2, use='dot')
+    offsets = np.arange(-half_window, half_window + 1)
+    result = np.empty(len(positions))
+    for start in range(0, len(positions), block_size):
+        block = np.clip(positions[start:start + block_size], half_window, length - 1 - half_window)
+        result[start:start + block_size] = values_at(block[:, np.newaxis] + offsets) @ coeffs
+
+    head = positions < half_window
+    if head.any():
+        result[head] = savgol_filter(values_at(np.arange(num_points)), num_points, 2)[positions[head]]
+    tail = positions > length - 1 - half_window
+    if tail.any():
+        result[tail] = savgol_filter(values_at(np.arange(length - num_points, length)), num_points, 2)[positions[tail] - (length - num_points)]
+    return result
+
+def smooth_preview(values_at, length, num_points, positions):
+    # Mirrors add_smoothed_column: positive odd windows are smoothed, anything else is left as is
+    if num_points > 0 and num_points % 2 != 0:
+        if num_points > length:
+            raise ValueError(f"{num_points} smoothing points is more than the {length} data points.")
+        return savgol_at(values_at, length, num_points, positions)
+    return values_at(positions)
+
+class SmoothingPreview:
+    def __init__(self, root, echem_data, image_data, smoothing_entries):
+        import numpy as np
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.root = root
+        self.smoothing_entries = smoothing_entries
+
+        # Everything is kept as plain arrays in hours since the first brightness frame, as combine_data does
+        first_time = image_data['Timestamp'].iloc[0]
+        self.echem_time = ((echem_data['Timestamp'] - first_time).dt.total_seconds() / 3600).to_numpy()
+        self.voltage = echem_data['Voltage(V)'].to_numpy(dtype=float)
+        self.current = echem_data['Current(mA)'].to_numpy(dtype=float)
+        self.image_time = ((image_data['Timestamp'] - first_time).dt.total_seconds() / 3600).to_numpy()
+        self.luminance = image_data['Luminance'].to_numpy(dtype=float)
+        self.echem_positions = decimate_positions(len(self.voltage), preview_points)
+        self.image_positions = decimate_positions(len(self.luminance), preview_points)
+
+        # The combined data only keeps frames within the echem data, and the brightness derivative is taken
+        # and smoothed over those frames alone, so the derivative trace covers the same frames
+        echem_times = echem_data['Timestamp'].to_numpy(dtype='datetime64[ns]')
+        image_times = image_data['Timestamp'].to_numpy(dtype='datetime64[ns]')
+        self.first_combined = np.searchsorted(image_times, echem_times[0], side='left') if len(echem_times) else 0
+        self.num_combined = (np.searchsorted(image_times, echem_times[-1], side='right') if len(echem_times) else 0) - self.first_combined
+        self.combined_positions = decimate_positions(self.num_combined, preview_points)
+        combined_time = self.image_time[self.first_combined + self.combined_positions]
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Smoothing Preview")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.status_label = tk.Label(self.window, text="")
+        self.status_label.pack(side=tk.BOTTOM, pady=5)
+
+        figure = Figure(figsize=(8, 8))
+        axes = figure.subplots(4, 1, sharex=True)
+        self.lines = {}
+        traces = [
+            ('voltage', 'Voltage (V)', self.echem_time[self.echem_positions], self.voltage[self.echem_positions], 'forestgreen'),
+            ('current', 'Current (mA)', self.echem_time[self.echem_positions], self.current[self.echem_positions], 'black'),
+            ('brightness', 'NGA', self.image_time[self.image_positions], self.luminance[self.image_positions], '#FF8C00'),
+            ('derivative', 'NGA Derivative', combined_time, np.full(len(self.combined_positions), np.nan), 'firebrick')
+        ]
+        for ax, (name, ylabel, x, raw, color) in zip(axes, traces):
+            self.lines[name + '_raw'], = ax.plot(x, raw, color='lightgrey', linewidth=1)
+            self.lines[name], = ax.plot(x, raw, color=color, linewidth=1.5)
+            ax.set_ylabel(ylabel)
+        axes[-1].set_xlabel('Test Time (h)')
+        self.axes = dict(zip(['voltage', 'current', 'brightness', 'derivative'], axes))
+        figure.tight_layout()
+
+        self.canvas = FigureCanvasTkAgg(figure, master=self.window)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        # A single worker thread always computes the most recent settings; older requests are dropped
+        self.generation = 0
+        self.latest = None
+        self.closed = False
+        self.wake = threading.Event()
+        self.results = queue.Queue()
+        self.debounce_id = None
+        threading.Thread(target=self.worker, daemon=True).start()
+
+        self.bindings = [(entry, entry.bind('<KeyRelease>', self.schedule, add='+')) for entry in smoothing_entries]
+        self.poll()
+        self.schedule()
+
+    def schedule(self, event=None):
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+        self.debounce_id = self.root.after(debounce_ms, self.request)
+
+    def request(self):
+        self.debounce_id = None
+        try:
+            points = tuple(int(entry.get()) for entry in self.smoothing_entries)
+        except ValueError:
+            self.status_label.config(text="Number of smoothing points must be an integer.")
+            return
+        self.generation += 1
+        self.latest = (self.generation, points)
+        self.wake.set()
+
+    def worker(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            if self.closed:
+                return
+            generation, points = self.latest
+            try:
+                self.results.put((generation, self.compute(*points), None))
+            except Exception as e:
+                self.results.put((generation, None, e))
+
+    def compute(self, voltage_points, current_points, brightness_points, brightness_derivative_points):
+        import numpy as np
+
+        length = len(self.luminance)
+
+        def smoothed_luminance(index):
+            return smooth_preview(lambda i: self.luminance[i], length, brightness_points, index.ravel()).reshape(index.shape)
+
+        def derivative(index):
+            # Brightness derivative at positions in the combined frames, from the smoothed brightness, with the
+            # first (NaN) point backfilled as add_smoothed_column does
+            index = np.maximum(index, 1) + self.first_combined
+            return (smoothed_luminance(index) - smoothed_luminance(index - 1)) / (self.image_time[index] - self.image_time[index - 1])
+
+        return {
+            'voltage': smooth_preview(lambda i: self.voltage[i], len(self.voltage), voltage_points, self.echem_positions),
+            'current': smooth_preview(lambda i: self.current[i], len(self.current), current_points, self.echem_positions),
+            'brightness': smoothed_luminance(self.image_positions),
+            # The first combined frame has no derivative until it is backfilled for smoothing
+            'derivative_raw': np.where(self.combined_positions == 0, np.nan, derivative(self.combined_positions)),
+            'derivative': self.smoothed_derivative(derivative, brightness_points, brightness_derivative_points)
+        }
+
+    def smoothed_derivative(self, derivative, brightness_points, brightness_derivative_points):
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+        from scipy.signal import savgol_coeffs
+
+        length = len(self.luminance)
+        combined_positions = self.combined_positions
+        if not (brightness_derivative_points > 0 and brightness_derivative_points % 2 != 0):
+            return np.where(combined_positions == 0, np.nan, derivative(combined_positions))
+
+        # Away from the ends of the data, each point needs one contiguous run of brightness values, so smooth
+        # the brightness, differentiate and smooth again on a single gathered block rather than point by point
+        smooth_brightness = brightness_points > 0 and brightness_points % 2 != 0
+        brightness_half = brightness_points // 2 if smooth_brightness else 0
+        derivative_half = brightness_derivative_points // 2
+        positions = combined_positions + self.first_combined
+        first = positions - derivative_half - 1 - brightness_half
+        last = positions + derivative_half + brightness_half
+        # The derivative window must be plain differences within the combined frames, and the brightness
+        # windows behind them within all frames
+        interior = ((combined_positions - derivative_half >= 1) & (combined_positions + derivative_half <= self.num_combined - 1)
+                    & (first >= 0) & (last <= length - 1))
+
+        result = np.empty(len(positions))
+        if interior.any():
+            luminance = self.luminance[first[interior, np.newaxis] + np.arange(brightness_derivative_points + 1 + 2 * brightness_half)]
+            if smooth_brightness:
+                luminance = sliding_window_view(luminance, brightness_points, axis=1) @ savgol_coeffs(brightness_points, 2, use='dot')
+            time = self.image_time[positions[interior, np.newaxis] + np.arange(-derivative_half - 1, derivative_half + 1)]
+            result[interior] = (np.diff(luminance, axis=1) / np.diff(time, axis=1)) @ savgol_coeffs(brightness_derivative_points, 2, use='dot')
+        if not interior.all():
+            result[~interior] = smooth_preview(derivative, self.num_combined, brightness_derivative_points, combined_positions[~interior])
+        return result
+
+    def poll(self):
+        if self.closed:
+            return
+        latest = None
+        while not self.results.empty():
+            latest = self.results.get()
+        if latest is not None and latest[0] == self.generation:
+            self.render(*latest[1:])
+        self.root.after(20, self.poll)
+
+    def render(self, traces, error):
+        if error is not None:
+            logging.warning(f"Smoothing preview failed: {error}")
+            self.status_label.config(text=f"Preview error: {error}")
+            return
+        for name, values in traces.items():
+            self.lines[name].set_ydata(values)
+        for ax in self.axes.values():
+            ax.relim()
+            ax.autoscale_view()
+        self.status_label.config(text="Preview of decimated data. Click Combine Data to apply at full resolution.")
+        self.canvas.draw_idle()
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+        for entry, binding in self.bindings:
+            entry.unbind('<KeyRelease>', binding)
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+        self.window.destroy()
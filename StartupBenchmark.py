@@ -0,0 +1,75 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# Measures module import time with `python -X importtime` for the library and command line entry points.
+# Run with: python StartupBenchmark.py
+# Times depend on the machine, so missing a target is only reported. The exit code is non-zero if a heavy
+# library is loaded at startup, which is what makes an import slow on any machine.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Libraries that should only load once the stage that needs them runs
+heavy_modules = {'numpy', 'pandas', 'scipy', 'cv2', 'matplotlib', 'openpyxl', 'multiprocessing', 'concurrent'}
+
+# (name, interpreter arguments, target in milliseconds)
+benchmarks = [
+    ('library: import BrightnessExtract', ['-c', 'import BrightnessExtract'], 100),
+    ('library: import CycleLagAnalysis', ['-c', 'import CycleLagAnalysis'], 100),
+    ('library: import EchemProcessing', ['-c', 'import EchemProcessing'], 100),
+    ('library: import GraphBrightnessData', ['-c', 'import GraphBrightnessData'], 100),
+    ('library: import InterpolateData', ['-c', 'import InterpolateData'], 100),
+    ('library: import SmoothingPreview', ['-c', 'import SmoothingPreview'], 100),
+    ('cli: EchemProcessing.py usage check', [os.path.join(script_dir, 'EchemProcessing.py')], 100),
+    ('cli: CycleLagAnalysis.py usage check', [os.path.join(script_dir, 'CycleLagAnalysis.py')], 100),
+]
+
+repeats = 5
+
+def run_importtime(args, cwd):
+    env = dict(os.environ, PYTHONPATH=script_dir)
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd, env=env, capture_output=True, text=True)
+
+    # Each line looks like "import time:   self |   cumulative | <indent>name", nesting shown by the indent
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$', line)
+        if match:
+            cumulative_us = int(match.group(2))
+            depth = len(match.group(3)) // 2
+            imports.append((match.group(4), cumulative_us, depth))
+    return imports
+
+def measure(args, baseline_modules, cwd):
+    best_ms = None
+    loaded_heavy = set()
+    for _ in range(repeats):
+        imports = run_importtime(args, cwd)
+        # Only count top level imports that the interpreter itself does not already make at startup
+        total_us = sum(cumulative for name, cumulative, depth in imports if depth == 0 and name not in baseline_modules)
+        loaded_heavy |= {name.split('.')[0] for name, _, _ in imports if name.split('.')[0] in heavy_modules}
+        total_ms = total_us / 1000
+        best_ms = total_ms if best_ms is None else min(best_ms, total_ms)
+    return best_ms, loaded_heavy
+
+def main():
+    failures = 0
+    # Run from an empty directory so importing InterpolateData does not leave a log file in the project
+    with tempfile.TemporaryDirectory() as cwd:
+        baseline_modules = {name for name, _, _ in run_importtime(['-c', 'pass'], cwd)}
+
+        print(f"{'Benchmark':<42}{'Time (ms)':>10}{'Target':>10}  Result")
+        for name, args, target_ms in benchmarks:
+            time_ms, loaded_heavy = measure(args, baseline_modules, cwd)
+            failures += 1 if loaded_heavy else 0
+            result = 'ok' if time_ms <= target_ms else 'slow'
+            if loaded_heavy:
+                result = f"FAIL (loaded {', '.join(sorted(loaded_heavy))})"
+            print(f"{name:<42}{time_ms:>10.1f}{target_ms:>10}  {result}")
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())